@@ -3,13 +3,12 @@ Airflow DAG for Stock Prediction Data Pipeline
 This DAG runs daily at 18:00 JST to collect and process stock prediction data.
 
 Task Flow:
-1. Fetch stock prices (yfinance)
+1. Fetch stock prices (yfinance) and upsert them into TimescaleDB
 2. Fetch macro indicators (e-Stat, BOJ)
 3. Fetch company fundamentals (EDINET)
 4. Fetch policy data (government sources)
 5. Data validation and cleaning
-6. Save to TimescaleDB
-7. Run prediction pipeline
+6. Run prediction pipeline
 """
 
 from datetime import datetime, timedelta
@@ -17,9 +16,23 @@ from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.utils.task_group import TaskGroup
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Shared storage for staged DataFrames; only the file paths go through XCom
+STAGE_DIR = os.getenv('STOCK_STAGE_DIR', '/opt/airflow/data/stage')
+
+# yfinance column -> stock_prices column
+STOCK_COLUMNS = {
+    'Date': 'date',
+    'Open': 'open_price',
+    'High': 'high_price',
+    'Low': 'low_price',
+    'Close': 'close_price',
+    'Volume': 'volume',
+}
+
 # Default arguments for DAG
 default_args = {
     'owner': 'stock-prediction-team',
@@ -39,53 +52,157 @@ dag = DAG(
     tags=['stock-prediction', 'daily'],
 )
 
+# Helpers
+
+def _stage_path(kind, name, ds):
+    """Return the Parquet path for a staged frame, creating its directory."""
+    directory = os.path.join(STAGE_DIR, kind, name)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{ds}.parquet")
+
+def _download_symbol(symbol, start):
+    """Download a single symbol; used for symbols missing from the batched call."""
+    import yfinance as yf
+    
+    # Ticker.history avoids yf.download's module-level shared state,
+    # so it is safe to call from worker threads
+    df = yf.Ticker(symbol).history(start=start, auto_adjust=False, actions=False)
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    return symbol, df
+
+async def _upsert_stock_prices(records):
+    """Upsert stock price records through a short-lived asyncpg pool."""
+    from db.async_pool import close_pool, get_pool, upsert_stock_prices
+    
+    # The pool is bound to this event loop, so it must not outlive asyncio.run
+    await get_pool(min_size=1, max_size=2)
+    try:
+        return await upsert_stock_prices(records)
+    finally:
+        await close_pool()
+
 # Python functions for each task
 
 def fetch_stock_prices(**context):
-    """Fetch stock prices from yfinance for all registered symbols."""
+    """Fetch stock prices from yfinance, validate them and upsert into TimescaleDB."""
+    import asyncio
+    import pandas as pd
     import yfinance as yf
+    from concurrent.futures import ThreadPoolExecutor, as_completed
     from datetime import datetime, timedelta
+    from db.async_pool import STOCK_PRICE_COLUMNS
     
     # Get symbols from config or database
     symbols = ['7203.T', '9202.T', '6758.T']  # Example symbols
+    start = datetime.now() - timedelta(days=90)
     
     try:
-        data = {}
+        # One batched request for all symbols instead of one round-trip each
+        data = yf.download(symbols, start=start, group_by='ticker',
+                           threads=True, progress=False)
+        
+        frames = {}
         for symbol in symbols:
-            df = yf.download(symbol, start=datetime.now() - timedelta(days=90), 
-                           progress=False)
-            data[symbol] = df.to_dict()
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                df = data[symbol]
+            else:
+                df = data
+            df = df.dropna(how='all')
+            if not df.empty:
+                frames[symbol] = df
+        
+        # Retry symbols the batch missed, in parallel (capped to avoid 429s)
+        missing = [symbol for symbol in symbols if symbol not in frames]
+        if missing:
+            logger.warning(f"Batched download missed {missing}, retrying individually")
+            with ThreadPoolExecutor(max_workers=min(8, len(missing))) as executor:
+                futures = [executor.submit(_download_symbol, symbol, start)
+                           for symbol in missing]
+                for future in as_completed(futures):
+                    symbol, df = future.result()
+                    if not df.empty:
+                        frames[symbol] = df
+        
+        logger.info(f"Successfully fetched stock prices for {len(frames)}/{len(symbols)} symbols")
+        
+        rows_inserted = 0
+        if frames:
+            # Map to the stock_prices schema and drop rows without a close price
+            df = pd.concat(
+                [frame.reset_index().assign(symbol=symbol) for symbol, frame in frames.items()],
+                ignore_index=True,
+            )
+            df = df.rename(columns=STOCK_COLUMNS)[['symbol', *STOCK_COLUMNS.values()]]
+            df = df.dropna(subset=['date', 'close_price'])
+            df['volume'] = df['volume'].round().astype('Int64')
+            
+            # Drop bars that would violate the stock_prices CHECK constraints;
+            # one bad bar must not abort the whole load (NULLs pass a CHECK)
+            valid = (
+                (df['close_price'] > 0)
+                & ~(df['high_price'] < df['low_price']).fillna(False)
+                & ~(df['volume'] < 0).fillna(False)
+            )
+            if not valid.all():
+                logger.warning(f"Dropping {int((~valid).sum())} invalid price bars: "
+                               f"{df.loc[~valid, ['symbol', 'date']].to_dict('records')}")
+                df = df[valid]
+            
+            # One row per (symbol, date): the upsert cannot touch a row twice
+            df = df.drop_duplicates(subset=['symbol', 'date'], keep='last')
+            now = datetime.utcnow()
+            # Time-ordered load keeps writes on the most recent chunk
+            df = df.sort_values(['date', 'symbol']) \
+                .assign(created_at=now, updated_at=now)[STOCK_PRICE_COLUMNS]
+            
+            records = df.astype(object).where(df.notna(), None) \
+                .itertuples(index=False, name=None)
+            # Re-fetched days (and retried runs) update in place instead of duplicating
+            rows_inserted = asyncio.run(_upsert_stock_prices(list(records)))
         
-        logger.info(f"Successfully fetched stock prices for {len(symbols)} symbols")
+        logger.info(f"Data successfully saved to database: {rows_inserted} rows")
         
-        # Push data to XCom for next task
+        # Only summary stats go through XCom; the rows are already in the DB
         context['task_instance'].xcom_push(
             key='stock_data',
-            value=data
+            value={'rows_inserted': rows_inserted, 'symbols': sorted(frames)}
         )
-        return {'status': 'success', 'symbols_count': len(symbols)}
+        return {'status': 'success', 'symbols_count': len(frames)}
     except Exception as e:
         logger.error(f"Error fetching stock prices: {str(e)}")
         raise
 
 def fetch_macro_indicators(**context):
     """Fetch macro economic indicators from e-Stat and BOJ."""
+    import asyncio
     import os
-    from datetime import datetime, timedelta
+    from data_collection.e_stat_api import EStatAPI
     
     try:
         macro_data = {}
         
-        # Fetch from e-Stat
+        # Fetch all e-Stat indicators concurrently over one HTTP/2 connection
         e_stat_key = os.getenv('E_STAT_API_KEY')
-        indicators = ['gdp_growth', 'cpi', 'unemployment_rate']
+        frames = asyncio.run(EStatAPI(e_stat_key).fetch_all())
         
-        # Placeholder for actual API calls
-        for indicator in indicators:
-            macro_data[indicator] = {'value': 0.0, 'date': str(datetime.now())}
+        for indicator, df in frames.items():
+            if df.empty:
+                logger.warning(f"No data returned for {indicator}")
+                continue
+            path = _stage_path('macro', indicator, context['ds'])
+            df.to_parquet(path, compression='zstd', index=False)
+            macro_data[indicator] = path
+        
+        # Per-indicator failures are tolerated, but an all-empty fetch is an outage
+        if not macro_data:
+            raise RuntimeError("e-Stat returned no data for any macro indicator")
         
         logger.info(f"Successfully fetched {len(macro_data)} macro indicators")
         
+        # Push only the Parquet paths to XCom for next task
         context['task_instance'].xcom_push(
             key='macro_data',
             value=macro_data
@@ -116,18 +233,33 @@ def fetch_policy_data(**context):
 
 def validate_and_clean_data(**context):
     """Validate data schema and clean/handle missing values."""
+    from data_collection.e_stat_api import validate_stats_parquet
+    
     try:
         ti = context['task_instance']
-        stock_data = ti.xcom_pull(task_ids='fetch_stock_prices', key='stock_data')
-        macro_data = ti.xcom_pull(task_ids='fetch_macro_indicators', key='macro_data')
+        # Stock prices are validated and loaded inside fetch_stock_prices
+        stock_summary = ti.xcom_pull(task_ids='data_collection.fetch_stock_prices',
+                                     key='stock_data')
+        macro_data = ti.xcom_pull(task_ids='data_collection.fetch_macro_indicators',
+                                  key='macro_data')
         
-        logger.info("Data validation and cleaning completed")
+        validated_macro = {}
+        for indicator, path in macro_data.items():
+            validated_path = _stage_path('validated', indicator, context['ds'])
+            if not validate_stats_parquet(path, validated_path):
+                logger.warning(f"No valid rows left for {indicator}")
+                continue
+            validated_macro[indicator] = validated_path
+        
+        logger.info(f"Data validation and cleaning completed: "
+                    f"{stock_summary['rows_inserted']} stock rows, "
+                    f"{len(validated_macro)}/{len(macro_data)} macro indicators")
         
         ti.xcom_push(
             key='validated_data',
             value={
-                'stock': stock_data,
-                'macro': macro_data
+                'stock': stock_summary,
+                'macro': validated_macro
             }
         )
         return {'status': 'success', 'validation_passed': True}
@@ -135,19 +267,6 @@ def validate_and_clean_data(**context):
         logger.error(f"Error validating data: {str(e)}")
         raise
 
-def save_to_database(**context):
-    """Save validated data to TimescaleDB."""
-    try:
-        ti = context['task_instance']
-        validated_data = ti.xcom_pull(task_ids='validate_and_clean_data', 
-                                     key='validated_data')
-        
-        logger.info("Data successfully saved to database")
-        return {'status': 'success', 'records_saved': 0}
-    except Exception as e:
-        logger.error(f"Error saving to database: {str(e)}")
-        raise
-
 def run_predictions(**context):
     """Execute machine learning prediction pipeline."""
     try:
@@ -184,12 +303,6 @@ with dag:
         provide_context=True,
     )
     
-    task_save_db = PythonOperator(
-        task_id='save_to_database',
-        python_callable=save_to_database,
-        provide_context=True,
-    )
-    
     task_predict = PythonOperator(
         task_id='run_predictions',
         python_callable=run_predictions,
@@ -197,4 +310,4 @@ with dag:
     )
     
     # Task dependencies
-    tg_collection >> task_validate >> task_save_db >> task_predict
+    tg_collection >> task_validate >> task_predict
@@ -1,15 +1,27 @@
 """
 FastAPI メインアプリケーション
 """
-from fastapi import FastAPI, HTTPException, Depends
+from aiocache import cached
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from db.async_pool import create_pool
+
+# 予測期間 → 予測対象日までの最大月数
+FORECAST_HORIZONS = {"quarterly": 3, "monthly": 1}
+
+# 予測結果のキャッシュ有効期間（秒）
+PREDICTION_CACHE_TTL = 900
+
 app = FastAPI(
     title="株価予測API",
     description="日本の国策データを統合した株価予測システム",
@@ -25,17 +37,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# レスポンス圧縮（バッチ予測など大きなJSON向け）
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+
+@app.on_event("startup")
+async def startup():
+    """DB接続プールを作成"""
+    app.state.pool = await create_pool(min_size=5, max_size=20)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """DB接続プールを閉じる"""
+    await app.state.pool.close()
+
 
 # モデル定義
 class PredictionResponse(BaseModel):
     symbol: str
-    company_name: str
+    company_name: Optional[str] = None
     prediction_date: str
     current_price: float
     target_date: str
     predicted_price: float
-    confidence_score: float
-    change_percentage: float
+    confidence_score: Optional[float] = None
+    change_percentage: Optional[float] = None
     policy_score: Optional[float] = None
 
 
@@ -50,8 +77,55 @@ async def root():
     return {"status": "ok", "message": "株価予測API稼働中"}
 
 
+@cached(
+    ttl=PREDICTION_CACHE_TTL,
+    key_builder=lambda f, symbol, forecast_horizon: f"prediction:{symbol}:{forecast_horizon}",
+    skip_cache_func=lambda result: result is None,
+)
+async def fetch_prediction(symbol: str, forecast_horizon: str) -> Optional[PredictionResponse]:
+    """銘柄の最新予測をDBから取得（存在しない場合はNone、結果はTTL付きでキャッシュ）"""
+    months = FORECAST_HORIZONS.get(forecast_horizon)
+    if months is None:
+        raise HTTPException(status_code=400, detail=f"Unknown forecast_horizon: {forecast_horizon}")
+    
+    async with app.state.pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT symbol, prediction_date, current_price, target_date,
+                   predicted_price, confidence_score, policy_score
+            FROM predictions
+            WHERE symbol = $1
+              AND target_date <= prediction_date + make_interval(months => $2)
+            ORDER BY prediction_date DESC, target_date DESC
+            LIMIT 1
+            """,
+            symbol, months,
+        )
+    
+    if row is None:
+        return None
+    
+    # 現在値が0の場合は変化率を算出できない
+    change_percentage = None
+    if row["current_price"]:
+        change_percentage = round(
+            (row["predicted_price"] - row["current_price"]) / row["current_price"] * 100, 2
+        )
+    
+    return PredictionResponse(
+        symbol=row["symbol"],
+        prediction_date=row["prediction_date"].date().isoformat(),
+        current_price=row["current_price"],
+        target_date=row["target_date"].date().isoformat(),
+        predicted_price=row["predicted_price"],
+        confidence_score=row["confidence_score"],
+        change_percentage=change_percentage,
+        policy_score=row["policy_score"],
+    )
+
+
 @app.get("/api/v1/predictions/{symbol}", response_model=PredictionResponse)
-async def get_prediction(symbol: str, forecast_horizon: str = "quarterly"):
+async def get_prediction(response: Response, symbol: str, forecast_horizon: str = "quarterly"):
     """
     特定銘柄の予測を取得
     
@@ -59,34 +133,33 @@ async def get_prediction(symbol: str, forecast_horizon: str = "quarterly"):
         symbol: 銘柄コード (例: 7203.T)
         forecast_horizon: 予測期間 (quarterly, monthly)
     """
-    # TODO: 実際の予測ロジックを実装
-    return PredictionResponse(
-        symbol=symbol,
-        company_name="サンプル企業",
-        prediction_date="2026-02-16",
-        current_price=2450.0,
-        target_date="2026-05-16",
-        predicted_price=2580.0,
-        confidence_score=75.5,
-        change_percentage=5.31,
-        policy_score=68.0
-    )
+    prediction = await fetch_prediction(symbol, forecast_horizon)
+    if prediction is None:
+        raise HTTPException(status_code=404, detail=f"No prediction found for {symbol}")
+    response.headers["Cache-Control"] = f"public, max-age={PREDICTION_CACHE_TTL}"
+    return prediction
 
 
 @app.post("/api/v1/predictions/batch")
-async def batch_predictions(request: BatchPredictionRequest):
+async def batch_predictions(request: BatchPredictionRequest, response: Response):
     """
     複数銘柄の予測を一括取得
     """
-    # TODO: バッチ予測ロジックを実装
-    predictions = []
-    for symbol in request.symbols:
-        predictions.append({
-            "symbol": symbol,
-            "predicted_price": 2500.0,
-            "confidence_score": 70.0
-        })
+    # 重複銘柄は1回だけ取得（順序は維持）
+    symbols = list(dict.fromkeys(request.symbols))
+    results = await asyncio.gather(*[
+        fetch_prediction(symbol, request.forecast_horizon) for symbol in symbols
+    ])
+    predictions = [
+        {
+            "symbol": p.symbol,
+            "predicted_price": p.predicted_price,
+            "confidence_score": p.confidence_score,
+        }
+        for p in results if p is not None
+    ]
     
+    response.headers["Cache-Control"] = f"public, max-age={PREDICTION_CACHE_TTL}"
     return {"predictions": predictions, "request_id": "req_001"}
 
 
@@ -95,14 +168,36 @@ async def get_macro_indicators():
     """
     最新のマクロ経済指標を取得
     """
-    # TODO: 実際のマクロ指標データを取得
-    return {
-        "last_updated": "2026-02-16T14:30:00Z",
-        "indicators": {
-            "gdp_growth_rate": {"value": 2.1, "unit": "%", "trend": "up"},
-            "cpi": {"value": 2.3, "unit": "%", "trend": "up"},
-            "policy_rate": {"value": 0.25, "unit": "%", "trend": "up"},
+    async with app.state.pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT DISTINCT ON (indicator_name)
+                   indicator_name, value, unit, prev_value, updated_at
+            FROM (
+                SELECT indicator_name, date, value, unit, updated_at,
+                       LAG(value) OVER (PARTITION BY indicator_name ORDER BY date) AS prev_value
+                FROM macro_indicators
+            ) t
+            ORDER BY indicator_name, date DESC
+            """
+        )
+    
+    indicators = {}
+    for row in rows:
+        if row["prev_value"] is None or row["value"] == row["prev_value"]:
+            trend = "flat"
+        else:
+            trend = "up" if row["value"] > row["prev_value"] else "down"
+        indicators[row["indicator_name"]] = {
+            "value": row["value"],
+            "unit": row["unit"],
+            "trend": trend,
         }
+    
+    updated = [row["updated_at"] for row in rows if row["updated_at"] is not None]
+    return {
+        "last_updated": max(updated).isoformat() if updated else None,
+        "indicators": indicators,
     }
 
 
@@ -111,21 +206,45 @@ async def get_policy_impact(days: int = 30, sector: Optional[str] = None):
     """
     最近の政策変化を取得
     """
-    # TODO: 実際の政策データを取得
+    async with app.state.pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT policy_type, announcement_date, policy_score, affected_sectors
+            FROM policy_data
+            WHERE announcement_date >= now() - make_interval(days => $1)
+              AND ($2::text IS NULL OR affected_sectors::jsonb ? $2)
+            ORDER BY announcement_date DESC
+            """,
+            days, sector,
+        )
+    
+    # affected_sectors はJSON配列の文字列で保存されている
+    # （セクター絞り込みは jsonb の要素一致で行い、LIKE のワイルドカード解釈を避ける）
+    policies = [
+        {
+            "policy_type": row["policy_type"],
+            "announcement_date": row["announcement_date"].date().isoformat(),
+            "policy_score": row["policy_score"],
+            "affected_sectors": json.loads(row["affected_sectors"] or "[]"),
+        }
+        for row in rows
+    ]
+    scores = [p["policy_score"] for p in policies if p["policy_score"] is not None]
+    
     return {
         "period": f"last_{days}_days",
-        "policies": [
-            {
-                "policy_type": "gx_investment",
-                "announcement_date": "2026-02-10",
-                "policy_score": 82.0,
-                "affected_sectors": ["renewable_energy", "automotive"],
-            }
-        ],
-        "overall_policy_score": 75.5
+        "policies": policies,
+        "overall_policy_score": round(sum(scores) / len(scores), 1) if scores else None,
     }
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(
+        "api.main:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", "8000")),
+        workers=os.cpu_count(),
+        loop="uvloop",
+        http="httptools",
+    )
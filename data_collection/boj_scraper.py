@@ -1,12 +1,15 @@
 """
 日本銀行（BOJ）データスクレイパー
 """
+import io
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from typing import Optional
 import logging
 
+from .session import get_session
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,6 +21,7 @@ class BOJScraper:
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
         }
+        self.session = get_session()
     
     def fetch_policy_rate(self) -> pd.DataFrame:
         """
@@ -29,14 +33,11 @@ class BOJScraper:
         url = f"{self.base_url}boj/other/discount/discount.htm"
         
         try:
-            response = requests.get(url, headers=self.headers, timeout=30)
+            response = self.session.get(url, headers=self.headers, timeout=30)
             response.raise_for_status()
             
-            # HTMLをパース
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # テーブルデータを抽出（実際のHTMLパターンに応じて調整が必要）
-            tables = pd.read_html(response.content)
+            # テーブルデータを lxml で直接抽出（実際のHTMLパターンに応じて調整が必要）
+            tables = pd.read_html(io.BytesIO(response.content), flavor='lxml')
             
             if tables:
                 df = tables[0]
@@ -63,18 +64,28 @@ class BOJScraper:
         url = f"{self.base_url}market/short/interest/jgbcm_all.csv"
         
         try:
-            df = pd.read_csv(url, encoding='shift_jis')
+            response = self.session.get(url, headers=self.headers, timeout=30)
+            response.raise_for_status()
             
-            # カラム名を整理
-            if len(df.columns) >= 2:
-                df = df.iloc[:, :2]
-                df.columns = ['date', 'yield']
-                df['date'] = pd.to_datetime(df['date'], errors='coerce')
-                df['yield'] = pd.to_numeric(df['yield'], errors='coerce')
-                df = df.dropna()
-                return df
+            # Shift_JIS → UTF-8 に変換し、pyarrowのCSVリーダーで先頭2列のみ読む
+            # （利回りは文字列で読み、想定外のトークンはセル単位でNaNにする）
+            data = response.content.decode('shift_jis').encode('utf-8')
+            table = pacsv.read_csv(
+                pa.BufferReader(data),
+                read_options=pacsv.ReadOptions(skip_rows=1, autogenerate_column_names=True),
+                parse_options=pacsv.ParseOptions(invalid_row_handler=lambda row: 'skip'),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=['f0', 'f1'],
+                    include_missing_columns=True,
+                    column_types={'f0': pa.string(), 'f1': pa.string()},
+                ),
+            )
             
-            return pd.DataFrame()
+            df = table.rename_columns(['date', 'yield']).to_pandas()
+            df['date'] = pd.to_datetime(df['date'], errors='coerce')
+            df['yield'] = pd.to_numeric(df['yield'], errors='coerce').astype('float32')
+            df = df.dropna()
+            return df
             
         except Exception as e:
             logger.error(f"Failed to fetch JGB 10Y yield: {e}")
@@ -1,21 +1,128 @@
 """
 e-Stat (政府統計ポータル) API クライアント
 """
+import asyncio
+import httpx
 import requests
 from datetime import datetime
+import numpy as np
 import pandas as pd
 from typing import Optional, Dict, List
 import logging
 
+from .session import (
+    RETRY_BACKOFF_FACTOR, RETRY_STATUS_FORCELIST, RETRY_TOTAL, get_session,
+)
+
 logger = logging.getLogger(__name__)
 
 
 class EStatAPI:
     """e-Stat API クライアント"""
     
+    GDP_STATS_ID = "0003410379"  # GDP統計ID
+    CPI_STATS_ID = "0003426263"  # CPI統計ID
+    UNEMPLOYMENT_STATS_ID = "0003103532"  # 失業率統計ID
+    
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.base_url = "https://api.e-stat.go.jp/rest/3.0/app/"
+        self.session = get_session()
+    
+    def _params(self, stats_data_id: str, **extra_params) -> Dict:
+        """統計データ取得APIのリクエストパラメータを作成"""
+        return {
+            "appId": self.api_key,
+            "lang": "J",
+            "statsDataId": stats_data_id,
+            "metaGetFlg": "Y",
+            "cntGetFlg": "N",
+            **extra_params,
+        }
+    
+    def _call(self, stats_data_id: str, **extra_params) -> Dict:
+        """
+        統計データ取得APIを呼び出す
+        
+        Args:
+            stats_data_id: 統計表ID
+            **extra_params: 追加のリクエストパラメータ
+            
+        Returns:
+            APIレスポンス
+        """
+        response = self.session.get(
+            f"{self.base_url}json/getStatsData",
+            params=self._params(stats_data_id, **extra_params),
+            timeout=30
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    async def _get(self, client: httpx.AsyncClient, name: str,
+                   stats_data_id: str, **extra_params) -> pd.DataFrame:
+        """
+        統計データを非同期に取得してDataFrameに変換
+        
+        429/5xx と通信エラーは同期セッションと同じ方針（指数バックオフ）で再試行する。
+        
+        Args:
+            client: 共有する非同期HTTPクライアント
+            name: ログ用の指標名
+            stats_data_id: 統計表ID
+            **extra_params: 追加のリクエストパラメータ
+            
+        Returns:
+            パース済みデータフレーム（失敗時は空）
+        """
+        params = self._params(stats_data_id, **extra_params)
+        try:
+            for attempt in range(RETRY_TOTAL + 1):
+                retryable = attempt < RETRY_TOTAL
+                try:
+                    response = await client.get("json/getStatsData", params=params)
+                except httpx.TransportError:
+                    if not retryable:
+                        raise
+                else:
+                    if not (retryable and response.status_code in RETRY_STATUS_FORCELIST):
+                        break
+                await asyncio.sleep(RETRY_BACKOFF_FACTOR * (2 ** attempt))
+            
+            response.raise_for_status()
+            return self._parse_stats_data(response.json())
+            
+        except (httpx.HTTPError, ValueError) as e:
+            # ValueError: JSONでないレスポンス本文（HTMLのエラーページ等）
+            logger.error(f"Failed to fetch {name} data: {e}")
+            return pd.DataFrame()
+    
+    async def fetch_all(self) -> Dict[str, pd.DataFrame]:
+        """
+        GDP・CPI・失業率を並行に取得
+        
+        HTTP/2 で1本のTLS接続に多重化し、3リクエストの待ち時間を重ねる。
+        
+        Returns:
+            指標名をキーとするデータフレームの辞書
+        """
+        async with httpx.AsyncClient(
+            http2=True,
+            base_url=self.base_url,
+            timeout=30,
+            limits=httpx.Limits(max_connections=8),
+        ) as client:
+            gdp, cpi, unemployment_rate = await asyncio.gather(
+                self._get(client, 'GDP', self.GDP_STATS_ID, sectionHeaderFlg="1"),
+                self._get(client, 'CPI', self.CPI_STATS_ID),
+                self._get(client, 'unemployment rate', self.UNEMPLOYMENT_STATS_ID),
+            )
+        
+        return {
+            'gdp': gdp,
+            'cpi': cpi,
+            'unemployment_rate': unemployment_rate,
+        }
         
     def fetch_gdp(self, start_year: Optional[int] = None) -> pd.DataFrame:
         """
@@ -30,24 +137,8 @@ class EStatAPI:
         if start_year is None:
             start_year = datetime.now().year - 5
             
-        params = {
-            "appId": self.api_key,
-            "lang": "J",
-            "statsDataId": "0003410379",  # GDP統計ID
-            "metaGetFlg": "Y",
-            "cntGetFlg": "N",
-            "sectionHeaderFlg": "1",
-        }
-        
         try:
-            response = requests.get(
-                f"{self.base_url}json/getStatsData",
-                params=params,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._call(self.GDP_STATS_ID, sectionHeaderFlg="1")
             return self._parse_stats_data(data)
             
         except requests.RequestException as e:
@@ -64,23 +155,8 @@ class EStatAPI:
         Returns:
             CPI データフレーム
         """
-        params = {
-            "appId": self.api_key,
-            "lang": "J",
-            "statsDataId": "0003426263",  # CPI統計ID
-            "metaGetFlg": "Y",
-            "cntGetFlg": "N",
-        }
-        
         try:
-            response = requests.get(
-                f"{self.base_url}json/getStatsData",
-                params=params,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._call(self.CPI_STATS_ID)
             return self._parse_stats_data(data)
             
         except requests.RequestException as e:
@@ -94,23 +170,8 @@ class EStatAPI:
         Returns:
             失業率データフレーム
         """
-        params = {
-            "appId": self.api_key,
-            "lang": "J",
-            "statsDataId": "0003103532",  # 失業率統計ID
-            "metaGetFlg": "Y",
-            "cntGetFlg": "N",
-        }
-        
         try:
-            response = requests.get(
-                f"{self.base_url}json/getStatsData",
-                params=params,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._call(self.UNEMPLOYMENT_STATS_ID)
             return self._parse_stats_data(data)
             
         except requests.RequestException as e:
@@ -136,21 +197,55 @@ class EStatAPI:
                 logger.warning("No data found in response")
                 return pd.DataFrame()
             
-            records = []
-            for item in values:
-                records.append({
-                    'date': item.get('@time'),
-                    'value': float(item.get('$', 0)),
-                    'unit': item.get('@unit', ''),
-                })
+            # 列ごとに抽出（レコードごとの辞書を作らない）
+            dates = [item.get('@time') for item in values]
+            vals = np.fromiter(
+                (float(item.get('$', 0)) for item in values),
+                dtype=np.float64,
+                count=len(values),
+            )
+            units = [item.get('@unit', '') for item in values]
             
-            df = pd.DataFrame(records)
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
+            df = pd.DataFrame({
+                'date': pd.to_datetime(dates, errors='coerce'),
+                'value': vals,
+                'unit': pd.Categorical(units),
+            })
             df = df.dropna(subset=['date'])
-            df = df.sort_values('date')
+            # 時系列はほぼ整列済みのため安定ソートが有利
+            df = df.sort_values('date', kind='stable')
             
             return df
             
         except Exception as e:
             logger.error(f"Failed to parse stats data: {e}")
             return pd.DataFrame()
+
+
+def validate_stats_parquet(source: str, destination: str) -> int:
+    """
+    ステージ済みの統計データParquetを検証し、検証済みParquetとして書き出す
+    
+    日付・値の欠損行のみ除外する。e-Stat の VALUE は同一時点に複数の
+    分類・地域系列を含むため、時点単位の重複はここでは集約しない。
+    
+    Args:
+        source: _parse_stats_data の結果を保存したParquetのパス
+        destination: 検証済みParquetの出力先
+        
+    Returns:
+        書き出した行数（0件の場合はファイルを出力しない）
+    """
+    import pyarrow.dataset as pads
+    
+    # ArrowDtype を経由すると unit（Categorical）が dictionary[pyarrow] 型として
+    # pandasメタデータに記録され、読み戻せなくなるため通常のdtypeで扱う
+    df = pads.dataset(source, format='parquet') \
+        .to_table(columns=['date', 'value', 'unit']) \
+        .to_pandas()
+    df = df.dropna(subset=['date', 'value']).sort_values('date', kind='stable')
+    if df.empty:
+        return 0
+    
+    df.to_parquet(destination, compression='zstd', index=False)
+    return len(df)
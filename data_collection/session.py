@@ -0,0 +1,41 @@
+"""
+データ収集用の共有HTTPセッション
+"""
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional
+
+# リトライ方針（同期・非同期クライアントで共通）
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_STATUS_FORCELIST = (429, 500, 502, 503, 504)
+
+_session: Optional[requests.Session] = None
+
+
+def get_session() -> requests.Session:
+    """
+    Keep-Alive・リトライ付きの共有セッションを取得
+
+    e-Stat / 日本銀行のクライアント間で接続（TLSセッション）を使い回す。
+
+    Returns:
+        共有 requests.Session
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=16,
+            max_retries=Retry(
+                total=RETRY_TOTAL,
+                backoff_factor=RETRY_BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUS_FORCELIST,
+            ),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
@@ -0,0 +1,85 @@
+"""
+asyncpg 接続プール管理（書き込み負荷の高い処理向け）
+"""
+import asyncpg
+from typing import Iterable, Optional, Sequence
+
+from .database import DATABASE_URL
+
+STOCK_PRICE_COLUMNS = [
+    "symbol", "date", "open_price", "high_price", "low_price",
+    "close_price", "volume", "created_at", "updated_at",
+]
+
+_pool: Optional[asyncpg.Pool] = None
+
+
+async def create_pool(**options) -> asyncpg.Pool:
+    """asyncpg接続プールを作成"""
+    params = {
+        "min_size": 10,
+        "max_size": 50,
+        "max_queries": 50000,
+        "max_inactive_connection_lifetime": 300,
+        "statement_cache_size": 1024,  # プリペアドステートメントキャッシュ
+    }
+    params.update(options)
+    return await asyncpg.create_pool(DATABASE_URL, **params)
+
+
+async def get_pool(**options) -> asyncpg.Pool:
+    """共有接続プールを取得（初回呼び出し時に options で作成）"""
+    global _pool
+    if _pool is None:
+        _pool = await create_pool(**options)
+    return _pool
+
+
+async def close_pool():
+    """共有接続プールを閉じる"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def upsert_stock_prices(
+    records: Iterable[Sequence],
+    columns: Sequence[str] = STOCK_PRICE_COLUMNS,
+) -> int:
+    """
+    株価データを一時テーブルへバイナリCOPYし、(symbol, date) 単位でUPSERT
+
+    同一トランザクション内で実行するため、再実行（Airflowのリトライ等）でも
+    重複行は発生しない。
+
+    Args:
+        records: columns の順に並んだレコード（(symbol, date) は一意であること）
+        columns: 投入先のカラム
+
+    Returns:
+        投入・更新件数
+    """
+    column_list = ", ".join(columns)
+    updates = ", ".join(
+        f"{column} = EXCLUDED.{column}"
+        for column in columns
+        if column not in ("symbol", "date", "created_at")
+    )
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(f"""
+                CREATE TEMP TABLE stock_prices_stage ON COMMIT DROP AS
+                SELECT {column_list} FROM stock_prices WITH NO DATA
+            """)
+            await conn.copy_records_to_table(
+                "stock_prices_stage", records=records, columns=list(columns)
+            )
+            result = await conn.execute(f"""
+                INSERT INTO stock_prices ({column_list})
+                SELECT {column_list} FROM stock_prices_stage
+                ON CONFLICT (symbol, date) DO UPDATE SET {updates}
+            """)
+    # result は "INSERT 0 <件数>" 形式
+    return int(result.split()[-1])
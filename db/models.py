@@ -1,7 +1,7 @@
 """
 SQLAlchemy モデル定義
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Index, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, REAL, DateTime, Text, Index, ForeignKey, CheckConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -12,19 +12,26 @@ class StockPrice(Base):
     """株価データ（時系列）"""
     __tablename__ = "stock_prices"
     
-    id = Column(Integer, primary_key=True, index=True)
-    symbol = Column(String(20), nullable=False, index=True)
-    date = Column(DateTime, nullable=False, index=True)
-    open_price = Column(Float)
-    high_price = Column(Float)
-    low_price = Column(Float)
-    close_price = Column(Float, nullable=False)
+    # ハイパーテーブルの一意制約は分割キー date を含む必要があるため主キーは (id, date)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    # symbol / date 単独のB-treeは持たない（一意インデックス idx_symbol_date と BRIN で賄う）
+    symbol = Column(String(20), nullable=False)
+    date = Column(DateTime, primary_key=True, nullable=False)
+    # 価格は4バイトのREAL（float4）で保持し行幅を抑える
+    open_price = Column(REAL)
+    high_price = Column(REAL)
+    low_price = Column(REAL)
+    close_price = Column(REAL, nullable=False)
     volume = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     __table_args__ = (
-        Index('idx_symbol_date', 'symbol', 'date'),
+        # 銘柄×日付で一意（UPSERT の競合キーを兼ねる）
+        Index('idx_symbol_date', 'symbol', 'date', unique=True),
+        CheckConstraint('close_price > 0', name='ck_stock_prices_close_price_positive'),
+        CheckConstraint('high_price >= low_price', name='ck_stock_prices_high_low'),
+        CheckConstraint('volume >= 0', name='ck_stock_prices_volume_non_negative'),
     )
 
 
@@ -33,8 +40,8 @@ class MacroIndicator(Base):
     __tablename__ = "macro_indicators"
     
     id = Column(Integer, primary_key=True, index=True)
-    indicator_name = Column(String(100), nullable=False, index=True)
-    date = Column(DateTime, nullable=False, index=True)
+    indicator_name = Column(String(100), nullable=False)
+    date = Column(DateTime, nullable=False)
     value = Column(Float, nullable=False)
     unit = Column(String(50))
     source = Column(String(100))  # e-Stat, BOJ, etc.
@@ -73,8 +80,8 @@ class Prediction(Base):
     __tablename__ = "predictions"
     
     id = Column(Integer, primary_key=True, index=True)
-    symbol = Column(String(20), nullable=False, index=True)
-    prediction_date = Column(DateTime, nullable=False, index=True)
+    symbol = Column(String(20), nullable=False)
+    prediction_date = Column(DateTime, nullable=False)
     target_date = Column(DateTime, nullable=False)
     current_price = Column(Float, nullable=False)
     predicted_price = Column(Float, nullable=False)
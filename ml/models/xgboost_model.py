@@ -1,29 +1,170 @@
 """
 XGBoostベースの予測モデル
 """
-import xgboost as xgb
+import xxhash
 import numpy as np
 import pandas as pd
+from numba import njit
 from sklearn.model_selection import TimeSeriesSplit
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_percentage_error
-import pickle
+import json
 import logging
+import os
+from collections import OrderedDict
 from typing import Tuple, Dict, Optional
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# 学習デバイス（GPUが見つからない場合はXGBoostがCPUにフォールバックする）
+XGB_DEVICE = os.getenv('XGB_DEVICE', 'cuda')
+
+# 予測結果キャッシュの最大件数（超過分は古い順に破棄）
+PREDICTION_CACHE_SIZE = 4096
+
+# 特徴量に含めない列
+NON_FEATURE_COLUMNS = ('close_price', 'date', 'symbol')
+
+# _compute_technical_indicators の出力列順
+TECHNICAL_FEATURES = (
+    'sma_20', 'sma_50', 'sma_200',
+    'volatility', 'rsi',
+    'macd', 'signal',
+    'price_lag_1', 'return_lag_1',
+    'price_lag_5', 'return_lag_5',
+    'price_lag_20', 'return_lag_20',
+    'volume_sma', 'volume_ratio',
+)
+
+
+@njit(inline='always')
+def _slide(total, nans, new, old):
+    """ローリング窓の合計とNaN数を1ステップ更新"""
+    if np.isnan(new):
+        nans += 1
+    else:
+        total += new
+    if np.isnan(old):
+        nans -= 1
+    else:
+        total -= old
+    return total, nans
+
+
+@njit(inline='always')
+def _pct(close, i, lag):
+    """close[i] の lag 期前比リターン（範囲外はNaN）"""
+    if i < lag:
+        return np.nan
+    return close[i] / close[i - lag] - 1.0
+
+
+@njit(inline='always')
+def _ema_step(ema, weight, x, alpha):
+    """ewm(adjust=False) のEMAを1ステップ更新（NaNの扱いもpandasと同じ）"""
+    if np.isnan(ema):
+        if np.isnan(x):
+            return ema, weight
+        return x, 1.0
+    weight *= 1.0 - alpha
+    if not np.isnan(x):
+        ema = (weight * ema + alpha * x) / (weight + alpha)
+        weight = 1.0
+    return ema, weight
+
+
+@njit(cache=True, error_model='numpy')
+def _compute_technical_indicators(close, volume, out):
+    """
+    テクニカル指標を1パスで計算し out に書き込む
+
+    pandas の rolling(N).mean()/std() と同じく、窓内にNaNを含む場合や
+    N件未満の場合はNaNを返す。
+
+    Args:
+        close: 終値 (float64)
+        volume: 出来高 (float64)
+        out: (len(close), len(TECHNICAL_FEATURES)) の出力配列
+    """
+    n = close.shape[0]
+    sum20 = sum50 = sum200 = 0.0
+    nan20 = nan50 = nan200 = 0
+    ret_sum = ret_sq = 0.0
+    ret_nan = 0
+    gain_sum = loss_sum = 0.0
+    ema12 = ema26 = ema9 = np.nan
+    w12 = w26 = w9 = 0.0
+    vol_sum = 0.0
+    vol_nan = 0
+
+    for i in range(n):
+        c = close[i]
+
+        # 移動平均
+        sum20, nan20 = _slide(sum20, nan20, c, close[i - 20] if i >= 20 else 0.0)
+        sum50, nan50 = _slide(sum50, nan50, c, close[i - 50] if i >= 50 else 0.0)
+        sum200, nan200 = _slide(sum200, nan200, c, close[i - 200] if i >= 200 else 0.0)
+        out[i, 0] = sum20 / 20 if i >= 19 and nan20 == 0 else np.nan
+        out[i, 1] = sum50 / 50 if i >= 49 and nan50 == 0 else np.nan
+        out[i, 2] = sum200 / 200 if i >= 199 and nan200 == 0 else np.nan
+
+        # ボラティリティ（日次リターンの20日標準偏差）
+        r = _pct(close, i, 1)
+        r_old = _pct(close, i - 20, 1) if i >= 20 else 0.0
+        ret_sum, ret_nan = _slide(ret_sum, ret_nan, r, r_old)
+        ret_sq, _ = _slide(ret_sq, 0, r * r, r_old * r_old)
+        if i >= 19 and ret_nan == 0:
+            var = (ret_sq - ret_sum * ret_sum / 20) / 19
+            out[i, 3] = np.sqrt(var) if var > 0.0 else 0.0
+        else:
+            out[i, 3] = np.nan
+
+        # RSI（14日単純平均）
+        d = c - close[i - 1] if i >= 1 else np.nan
+        gain_sum += d if d > 0 else 0.0
+        loss_sum += -d if d < 0 else 0.0
+        if i >= 14:
+            d_old = close[i - 14] - close[i - 15] if i >= 15 else np.nan
+            gain_sum -= d_old if d_old > 0 else 0.0
+            loss_sum -= -d_old if d_old < 0 else 0.0
+        out[i, 4] = 100.0 - 100.0 / (1.0 + gain_sum / loss_sum) if i >= 13 else np.nan
+
+        # MACD（EMA-12/26 とシグナルEMA-9 を同じループで更新）
+        ema12, w12 = _ema_step(ema12, w12, c, 2.0 / 13.0)
+        ema26, w26 = _ema_step(ema26, w26, c, 2.0 / 27.0)
+        macd = ema12 - ema26
+        ema9, w9 = _ema_step(ema9, w9, macd, 2.0 / 10.0)
+        out[i, 5] = macd
+        out[i, 6] = ema9
+
+        # ラグ特徴量
+        out[i, 7] = close[i - 1] if i >= 1 else np.nan
+        out[i, 8] = r
+        out[i, 9] = close[i - 5] if i >= 5 else np.nan
+        out[i, 10] = _pct(close, i, 5)
+        out[i, 11] = close[i - 20] if i >= 20 else np.nan
+        out[i, 12] = _pct(close, i, 20)
+
+        # ボリューム特徴量
+        vol_sum, vol_nan = _slide(vol_sum, vol_nan, volume[i], volume[i - 20] if i >= 20 else 0.0)
+        vol_sma = vol_sum / 20 if i >= 19 and vol_nan == 0 else np.nan
+        out[i, 13] = vol_sma
+        out[i, 14] = volume[i] / vol_sma
+
 
 class XGBoostStockPredictor:
     """XGBoostを使用した株価予測モデル"""
     
     def __init__(self, model_version: str = "1.0"):
         self.model = None
-        self.scaler = StandardScaler()
+        # 標準化パラメータ（学習データのみから算出）
+        self.mu = None
+        self.sd = None
         self.model_version = model_version
-        self.feature_names = []
+        self.feature_names = ()
         self.feature_importance = {}
+        # 入力内容のハッシュ → 予測結果
+        self._pred_cache = OrderedDict()
         
     def prepare_features(self, df: pd.DataFrame, lookback: int = 90) -> Tuple[np.ndarray, np.ndarray]:
         """
@@ -37,55 +178,46 @@ class XGBoostStockPredictor:
             X: 特徴量行列
             y: ターゲット値
         """
-        features = []
-        
-        # テクニカル指標を計算
-        df['sma_20'] = df['close_price'].rolling(20).mean()
-        df['sma_50'] = df['close_price'].rolling(50).mean()
-        df['sma_200'] = df['close_price'].rolling(200).mean()
+        # 入力列（価格・マクロ指標など）＋テクニカル指標を1つの行列に直接書き込む（df は変更しない）
+        passthrough = [col for col in df.columns
+                       if col not in NON_FEATURE_COLUMNS and col not in TECHNICAL_FEATURES]
+        n_passthrough = len(passthrough)
+        self.feature_names = tuple(passthrough) + TECHNICAL_FEATURES
         
-        # ボラティリティ
-        df['volatility'] = df['close_price'].pct_change().rolling(20).std()
+        features = np.empty((len(df), len(self.feature_names)), dtype=np.float32)
+        features[:, :n_passthrough] = df[passthrough].to_numpy(dtype=np.float32)
         
-        # RSI計算
-        delta = df['close_price'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-        rs = gain / loss
-        df['rsi'] = 100 - (100 / (1 + rs))
+        # テクニカル指標を1パスで計算
+        close = df['close_price'].to_numpy(dtype=np.float64)
+        volume = df['volume'].to_numpy(dtype=np.float64)
+        _compute_technical_indicators(close, volume, features[:, n_passthrough:])
         
-        # MACD
-        exp1 = df['close_price'].ewm(span=12, adjust=False).mean()
-        exp2 = df['close_price'].ewm(span=26, adjust=False).mean()
-        df['macd'] = exp1 - exp2
-        df['signal'] = df['macd'].ewm(span=9, adjust=False).mean()
+        # NaNを含む行を削除
+        valid = ~np.isnan(features).any(axis=1) & ~np.isnan(close)
         
-        # ラグ特徴量
-        for lag in [1, 5, 20]:
-            df[f'price_lag_{lag}'] = df['close_price'].shift(lag)
-            df[f'return_lag_{lag}'] = df['close_price'].pct_change(lag)
-        
-        # ボリューム特徴量
-        df['volume_sma'] = df['volume'].rolling(20).mean()
-        df['volume_ratio'] = df['volume'] / df['volume_sma']
-        
-        self.feature_names = [col for col in df.columns 
-                             if col not in ['close_price', 'date', 'symbol']]
-        
-        # NaNを削除
-        df = df.dropna()
-        
-        # 特徴量とターゲット
-        X = df[self.feature_names].values
-        y = df['close_price'].values
-        
-        # 正規化
-        X = self.scaler.fit_transform(X)
+        # 特徴量とターゲット（正規化はリークを避けるため train() で実施）
+        X = features[valid]
+        y = close[valid].astype(np.float32)
         
         return X, y
     
+    @staticmethod
+    def _fit_scaling(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """列ごとの平均・標準偏差を算出（標準偏差0の列は1とする）"""
+        mu = X.mean(axis=0, dtype=np.float64)
+        sd = X.std(axis=0, dtype=np.float64)
+        sd[sd == 0] = 1.0
+        return mu.astype(np.float32), sd.astype(np.float32)
+    
+    @staticmethod
+    def _scale(X: np.ndarray, mu: np.ndarray, sd: np.ndarray) -> np.ndarray:
+        """(X - mu) / sd をfloat32で計算"""
+        X_scaled = np.subtract(X, mu, dtype=np.float32)
+        return np.divide(X_scaled, sd, out=X_scaled)
+    
     def train(self, X: np.ndarray, y: np.ndarray, 
-              test_size: float = 0.2, **xgb_params) -> Dict[str, float]:
+              test_size: float = 0.2, num_boost_round: int = 1000,
+              **xgb_params) -> Dict[str, float]:
         """
         モデルを学習
         
@@ -93,11 +225,15 @@ class XGBoostStockPredictor:
             X: 特徴量行列
             y: ターゲット値
             test_size: テストセットの割合
+            num_boost_round: ブースティングの最大ラウンド数
             **xgb_params: XGBoostハイパーパラメータ
             
         Returns:
             評価メトリクス
         """
+        # XGBoost は共有ライブラリの読み込みが重いため学習・読み込み時にのみインポート
+        import xgboost as xgb
+        
         # デフォルトハイパーパラメータ
         default_params = {
             'objective': 'reg:squarederror',
@@ -105,10 +241,20 @@ class XGBoostStockPredictor:
             'learning_rate': 0.1,
             'subsample': 0.8,
             'colsample_bytree': 0.8,
-            'random_state': 42,
+            'seed': 42,
+            'tree_method': 'hist',
+            'grow_policy': 'lossguide',
+            'device': XGB_DEVICE,
+            'max_bin': 256,
+            'nthread': -1,  # ヒストグラム構築を全コアで並列化
         }
         default_params.update(xgb_params)
         
+        X = X.astype(np.float32, copy=False)
+        y = y.astype(np.float32, copy=False)
+        feature_names = list(self.feature_names) or None
+        max_bin = default_params['max_bin']
+        
         # 時系列スプリット
         tscv = TimeSeriesSplit(n_splits=5)
         scores = []
@@ -117,30 +263,47 @@ class XGBoostStockPredictor:
             X_train, X_test = X[train_idx], X[test_idx]
             y_train, y_test = y[train_idx], y[test_idx]
             
-            # モデル学習
-            self.model = xgb.XGBRegressor(**default_params, n_estimators=1000)
-            self.model.fit(
-                X_train, y_train,
-                eval_set=[(X_test, y_test)],
-                early_stopping_rounds=50,
-                verbose=False
-            )
+            # 学習フォールドの統計量のみで標準化
+            mu, sd = self._fit_scaling(X_train)
+            X_train = self._scale(X_train, mu, sd)
+            X_test = self._scale(X_test, mu, sd)
+            
+            # モデル学習（検証フォールドは学習フォールドのビン境界を再利用）
+            dtrain = xgb.QuantileDMatrix(X_train, y_train, max_bin=max_bin,
+                                         feature_names=feature_names)
+            dtest = xgb.QuantileDMatrix(X_test, y_test, ref=dtrain,
+                                        feature_names=feature_names)
+            with xgb.config_context(verbosity=0):
+                booster = xgb.train(
+                    default_params, dtrain,
+                    num_boost_round=num_boost_round,
+                    evals=[(dtest, 'val')],
+                    early_stopping_rounds=50,
+                    verbose_eval=False
+                )
             
             # 評価
-            y_pred = self.model.predict(X_test)
+            y_pred = booster.inplace_predict(
+                X_test, iteration_range=(0, booster.best_iteration + 1)
+            )
             rmse = np.sqrt(mean_squared_error(y_test, y_pred))
             mape = mean_absolute_percentage_error(y_test, y_pred)
             scores.append({'rmse': rmse, 'mape': mape})
         
         # 最終モデル（全データで学習）
-        self.model = xgb.XGBRegressor(**default_params, n_estimators=1000)
-        self.model.fit(X, y)
+        self.mu, self.sd = self._fit_scaling(X)
+        dfull = xgb.QuantileDMatrix(self._scale(X, self.mu, self.sd), y,
+                                    max_bin=max_bin, feature_names=feature_names)
+        with xgb.config_context(verbosity=0):
+            self.model = xgb.train(default_params, dfull, num_boost_round=num_boost_round)
+        self._pred_cache.clear()
         
-        # 特徴量重要度
-        self.feature_importance = dict(zip(
-            self.feature_names,
-            self.model.feature_importances_
-        ))
+        # 特徴量重要度（gainを合計1に正規化）
+        gain = self.model.get_score(importance_type='gain')
+        total_gain = sum(gain.values()) or 1.0
+        self.feature_importance = {
+            name: gain.get(name, 0.0) / total_gain for name in self.feature_names
+        }
         
         avg_rmse = np.mean([s['rmse'] for s in scores])
         avg_mape = np.mean([s['mape'] for s in scores])
@@ -162,28 +325,63 @@ class XGBoostStockPredictor:
         if self.model is None:
             raise ValueError("Model not trained yet")
         
-        X_scaled = self.scaler.transform(X)
-        return self.model.predict(X_scaled)
+        # 同一入力は内容のハッシュで引き当て、DMatrix構築と木の走査を省く
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        key = (X.shape, xxhash.xxh3_64_intdigest(X.tobytes()))
+        hit = self._pred_cache.get(key)
+        if hit is not None:
+            return hit.copy()
+        
+        if len(X) > 1:
+            # 重複行（同一銘柄・同一日など）は1回だけ予測して元の並びに戻す
+            X_unique, inverse = np.unique(X, axis=0, return_inverse=True)
+            predictions = self.model.inplace_predict(
+                self._scale(X_unique, self.mu, self.sd)
+            )[inverse.reshape(-1)]
+        else:
+            predictions = self.model.inplace_predict(self._scale(X, self.mu, self.sd))
+        
+        self._pred_cache[key] = predictions
+        if len(self._pred_cache) > PREDICTION_CACHE_SIZE:
+            self._pred_cache.popitem(last=False)
+        return predictions.copy()
     
     def save_model(self, path: str):
-        """モデルを保存"""
-        with open(path, 'wb') as f:
-            pickle.dump({
-                'model': self.model,
-                'scaler': self.scaler,
-                'feature_names': self.feature_names,
+        """
+        モデルを保存
+        
+        以下の3ファイルを出力する:
+            {path}.ubj: XGBoostネイティブ形式（UBJSON）のBooster
+            {path}.meta.json: 特徴量名・重要度・モデルバージョン
+            {path}.scaler.npz: 標準化パラメータ
+        """
+        if self.model is None:
+            raise ValueError("Model not trained yet")
+        
+        self.model.save_model(f"{path}.ubj")
+        with open(f"{path}.meta.json", 'w', encoding='utf-8') as f:
+            json.dump({
+                'feature_names': list(self.feature_names),
                 'feature_importance': self.feature_importance,
                 'model_version': self.model_version,
-            }, f)
+            }, f, ensure_ascii=False)
+        np.savez(f"{path}.scaler.npz", mu=self.mu, sd=self.sd)
         logger.info(f"Model saved to {path}")
     
     def load_model(self, path: str):
         """モデルを読み込む"""
-        with open(path, 'rb') as f:
-            data = pickle.load(f)
-            self.model = data['model']
-            self.scaler = data['scaler']
-            self.feature_names = data['feature_names']
-            self.feature_importance = data['feature_importance']
-            self.model_version = data['model_version']
+        import xgboost as xgb
+        
+        booster = xgb.Booster()
+        booster.load_model(f"{path}.ubj")
+        self.model = booster
+        self._pred_cache.clear()
+        with open(f"{path}.meta.json", encoding='utf-8') as f:
+            meta = json.load(f)
+        self.feature_names = tuple(meta['feature_names'])
+        self.feature_importance = meta['feature_importance']
+        self.model_version = meta['model_version']
+        with np.load(f"{path}.scaler.npz") as scaler:
+            self.mu = scaler['mu']
+            self.sd = scaler['sd']
         logger.info(f"Model loaded from {path}")
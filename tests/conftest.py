@@ -0,0 +1,67 @@
+"""
+テスト共通フィクスチャ
+"""
+import os
+
+# xdist ワーカー間でのスレッド過剰生成を防ぐ（OpenMP初期化前に設定する必要がある）
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+import numpy as np
+import pytest
+
+from data_collection.e_stat_api import EStatAPI
+from data_collection.boj_scraper import BOJScraper
+from ml.models.xgboost_model import XGBoostStockPredictor
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _warm_imports():
+    """重いライブラリをワーカーごとに一度だけ先読みする"""
+    import pandas  # noqa: F401
+    import xgboost  # noqa: F401
+
+
+@pytest.fixture(scope="session")
+def estat_api():
+    """e-Stat APIクライアント（セッション内で共有）"""
+    return EStatAPI(api_key="test_key")
+
+
+@pytest.fixture(scope="session")
+def boj_scraper():
+    """日本銀行スクレイパー（セッション内で共有）"""
+    return BOJScraper()
+
+
+@pytest.fixture(scope="session")
+def xgb_model():
+    """未学習のXGBoostモデル（セッション内で共有）"""
+    return XGBoostStockPredictor()
+
+
+@pytest.fixture(scope="session")
+def sample_data():
+    """学習用サンプルデータ（TimeSeriesSplit の5分割に足りる行数）"""
+    features = np.array([
+        [1, 2, 3],
+        [2, 3, 4],
+        [3, 4, 5],
+        [4, 5, 6],
+        [5, 6, 7],
+        [6, 7, 8],
+        [7, 8, 9],
+        [8, 9, 10],
+    ], dtype=np.float32)
+    target = np.array([100, 110, 105, 115, 120, 118, 125, 130], dtype=np.float32)
+    return features, target
+
+
+@pytest.fixture(scope="session")
+def trained_xgb_model(sample_data):
+    """学習済みXGBoostモデル（学習はセッション内で1回だけ）"""
+    features, target = sample_data
+    model = XGBoostStockPredictor()
+    # 形状と型の確認用なので最小構成で学習
+    model.train(features, target,
+                num_boost_round=1, max_depth=2, nthread=1, device='cpu')
+    return model
@@ -0,0 +1,182 @@
+"""
+APIエンドポイントの単体テスト（DB接続はスタブプールで置き換える）
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app, fetch_prediction
+
+
+class StubPool:
+    """asyncpgプールの代替（クエリと引数を記録し、用意した行を返す）"""
+
+    def __init__(self, row=None, rows=()):
+        self.row = row
+        self.rows = list(rows)
+        self.calls = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    async def fetchrow(self, query, *args):
+        self.calls.append((query, args))
+        return self.row
+
+    async def fetch(self, query, *args):
+        self.calls.append((query, args))
+        return self.rows
+
+
+def _prediction_row(current_price=2000.0, predicted_price=2100.0):
+    return {
+        "symbol": "7203.T",
+        "prediction_date": datetime(2024, 1, 15, 9, 0),
+        "current_price": current_price,
+        "target_date": datetime(2024, 4, 15),
+        "predicted_price": predicted_price,
+        "confidence_score": 0.8,
+        "policy_score": 0.5,
+    }
+
+
+@pytest.fixture
+def stub_pool():
+    """app.state.pool をスタブに差し替え、予測キャッシュを空にする"""
+    pool = StubPool()
+    app.state.pool = pool
+    asyncio.run(fetch_prediction.cache.clear())
+    yield pool
+    asyncio.run(fetch_prediction.cache.clear())
+    del app.state.pool
+
+
+@pytest.fixture
+def client(stub_pool):
+    # with文を使わない（startupでDBへ接続しない）
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("horizon, months", [("quarterly", 3), ("monthly", 1)])
+def test_prediction_horizon_filters_months(client, stub_pool, horizon, months):
+    """予測期間が月数としてクエリに渡されること"""
+    stub_pool.row = _prediction_row()
+    response = client.get(f"/api/v1/predictions/7203.T?forecast_horizon={horizon}")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["change_percentage"] == 5.0
+    assert body["prediction_date"] == "2024-01-15"
+    assert stub_pool.calls[0][1] == ("7203.T", months)
+    assert response.headers["Cache-Control"] == "public, max-age=900"
+
+
+def test_prediction_unknown_horizon(client, stub_pool):
+    """未知の予測期間は400を返しDBへ問い合わせないこと"""
+    response = client.get("/api/v1/predictions/7203.T?forecast_horizon=yearly")
+    assert response.status_code == 400
+    assert stub_pool.calls == []
+
+
+def test_prediction_not_found(client, stub_pool):
+    """該当する予測がない場合は404を返すこと"""
+    response = client.get("/api/v1/predictions/9999.T")
+    assert response.status_code == 404
+
+
+def test_prediction_zero_price(client, stub_pool):
+    """現在値が0の場合は変化率をNoneにすること"""
+    stub_pool.row = _prediction_row(current_price=0.0)
+    response = client.get("/api/v1/predictions/7203.T")
+    assert response.status_code == 200
+    assert response.json()["change_percentage"] is None
+
+
+def test_macro_indicators_trend(client, stub_pool):
+    """前回値との比較でトレンドが決まること"""
+    stub_pool.rows = [
+        {"indicator_name": "cpi", "value": 3.1, "unit": "%", "prev_value": 3.0,
+         "updated_at": datetime(2024, 1, 10)},
+        {"indicator_name": "policy_rate", "value": -0.1, "unit": "%", "prev_value": -0.1,
+         "updated_at": datetime(2024, 1, 12)},
+        {"indicator_name": "unemployment_rate", "value": 2.4, "unit": "%", "prev_value": 2.5,
+         "updated_at": None},
+        {"indicator_name": "gdp", "value": 550.0, "unit": "兆円", "prev_value": None,
+         "updated_at": None},
+    ]
+    body = client.get("/api/v1/macro-indicators").json()
+    trends = {name: ind["trend"] for name, ind in body["indicators"].items()}
+    assert trends == {
+        "cpi": "up", "policy_rate": "flat", "unemployment_rate": "down", "gdp": "flat",
+    }
+    assert body["last_updated"] == "2024-01-12T00:00:00"
+
+
+def test_macro_indicators_empty(client, stub_pool):
+    """指標がない場合はlast_updatedがNoneになること"""
+    assert client.get("/api/v1/macro-indicators").json() == {
+        "last_updated": None, "indicators": {},
+    }
+
+
+@pytest.mark.parametrize("sector", [None, "自動車", "100%_sector"])
+def test_policy_impact_sector_filter(client, stub_pool, sector):
+    """セクターはjsonbの要素一致でパラメータとして渡されること（LIKEを使わない）"""
+    stub_pool.rows = [
+        {"policy_type": "monetary", "announcement_date": datetime(2024, 1, 10),
+         "policy_score": 0.6, "affected_sectors": json.dumps(["自動車", "銀行"])},
+        {"policy_type": "fiscal", "announcement_date": datetime(2024, 1, 5),
+         "policy_score": 0.4, "affected_sectors": None},
+    ]
+    params = {"days": 7} if sector is None else {"days": 7, "sector": sector}
+    body = client.get("/api/v1/policy-impact", params=params).json()
+
+    query, args = stub_pool.calls[0]
+    assert "affected_sectors::jsonb ? $2" in query
+    assert "LIKE" not in query
+    assert args == (7, sector)
+    assert body["period"] == "last_7_days"
+    assert body["policies"][0]["affected_sectors"] == ["自動車", "銀行"]
+    assert body["policies"][1]["affected_sectors"] == []
+    assert body["overall_policy_score"] == 0.5
+
+
+def test_prediction_cached(client, stub_pool):
+    """2回目のリクエストはキャッシュから返しDBへ問い合わせないこと"""
+    stub_pool.row = _prediction_row()
+    first = client.get("/api/v1/predictions/7203.T")
+    second = client.get("/api/v1/predictions/7203.T")
+    assert first.json() == second.json()
+    assert len(stub_pool.calls) == 1
+
+    # 予測期間が異なれば別のキャッシュキー
+    client.get("/api/v1/predictions/7203.T?forecast_horizon=monthly")
+    assert len(stub_pool.calls) == 2
+
+
+def test_prediction_none_not_cached(client, stub_pool):
+    """予測がない結果（None）はキャッシュしないこと"""
+    assert client.get("/api/v1/predictions/7203.T").status_code == 404
+    stub_pool.row = _prediction_row()
+    assert client.get("/api/v1/predictions/7203.T").status_code == 200
+    assert len(stub_pool.calls) == 2
+
+
+def test_batch_predictions_dedupes_symbols(client, stub_pool):
+    """一括取得で重複した銘柄は1回だけ取得すること"""
+    stub_pool.row = _prediction_row()
+    response = client.post(
+        "/api/v1/predictions/batch",
+        json={"symbols": ["7203.T", "6758.T", "7203.T", "6758.T"]},
+    )
+    assert response.status_code == 200
+    assert [args for _, args in stub_pool.calls] == [("7203.T", 3), ("6758.T", 3)]
+    assert len(response.json()["predictions"]) == 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__]))
@@ -1,105 +1,229 @@
 """
 データ収集モジュールの単体テスト
 """
+import asyncio
+import copy
+import httpx
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock
+import numpy as np
 import pandas as pd
-from datetime import datetime
 
+from data_collection.boj_scraper import BOJScraper
+from data_collection.e_stat_api import EStatAPI, validate_stats_parquet
+from data_collection.session import RETRY_TOTAL
+from ml.models.xgboost_model import (
+    XGBoostStockPredictor, _compute_technical_indicators, TECHNICAL_FEATURES,
+)
 
-def test_e_stat_api_initialization():
-    """e-Stat APIクライアントの初期化テスト"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+@pytest.fixture
+def prediction_model(trained_xgb_model):
+    """学習済みモデルのテストごとのコピー（予測キャッシュや再学習を他テストに漏らさない）"""
+    return copy.deepcopy(trained_xgb_model)
+
+
+@pytest.mark.parametrize("client, attr, expected", [
+    ("estat_api", "api_key", "test_key"),
+    ("estat_api", "base_url", "https://api.e-stat.go.jp/rest/3.0/app/"),
+    ("boj_scraper", "base_url", "https://www.boj.or.jp/statistics/"),
+])
+def test_client_initialization(request, client, attr, expected):
+    """データ収集クライアントの初期化テスト"""
+    assert getattr(request.getfixturevalue(client), attr) == expected
+
+
+def test_boj_scraper_headers(boj_scraper):
+    """日本銀行スクレイパーのリクエストヘッダーテスト"""
+    assert 'User-Agent' in boj_scraper.headers
+
+
+def test_boj_jgb_yield_skips_bad_cells():
+    """国債利回りCSVの不正トークン・重複ヘッダー行がセル単位で除外されるかのテスト"""
+    csv = (
+        "国債金利情報,,\n"
+        "基準日,10年,20年\n"
+        "2024/01/04,0.615,1.2\n"
+        "基準日,10年,20年\n"
+        "2024/01/05,ND,1.3\n"
+        "2024/01/09,-,1.3\n"
+        "2024/01/10,0.590,1.25\n"
+    ).encode('shift_jis')
+    scraper = BOJScraper()
+    scraper.session = Mock()
+    scraper.session.get.return_value = Mock(content=csv)
     
-    from data_collection.e_stat_api import EStatAPI
+    df = scraper.fetch_jgb_10y_yield()
     
-    api = EStatAPI(api_key="test_key")
-    assert api.api_key == "test_key"
-    assert api.base_url == "https://api.e-stat.go.jp/rest/3.0/app/"
+    assert df['date'].tolist() == [pd.Timestamp('2024-01-04'), pd.Timestamp('2024-01-10')]
+    np.testing.assert_allclose(df['yield'], [0.615, 0.590], rtol=1e-6)
+    assert df['yield'].dtype == np.float32
 
 
-def test_boj_scraper_initialization():
-    """日本銀行スクレイパーの初期化テスト"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+def _fetch_with_responses(estat_api, responses):
+    """e-Stat への応答を順に返すモックで _get を実行し、(結果, 呼び出し回数) を返す"""
+    calls = []
     
-    from data_collection.boj_scraper import BOJScraper
+    def handler(request):
+        calls.append(request)
+        return responses[min(len(calls), len(responses)) - 1]
     
-    scraper = BOJScraper()
-    assert scraper.base_url == "https://www.boj.or.jp/statistics/"
-    assert 'User-Agent' in scraper.headers
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler),
+                                     base_url=estat_api.base_url) as client:
+            return await estat_api._get(client, 'CPI', EStatAPI.CPI_STATS_ID)
+    
+    return asyncio.run(run()), len(calls)
+
+
+STATS_RESPONSE = {'GET_STATS_DATA': {'STATISTICAL_DATA': {'DATA_INF': {
+    'VALUE': [{'@time': '2024-01', '$': '1.5', '@unit': '%'}],
+}}}}
+
+
+@pytest.mark.parametrize("responses, expected_rows, expected_calls", [
+    # 429 の後に成功すれば再試行で取得できる
+    ([httpx.Response(429), httpx.Response(200, json=STATS_RESPONSE)], 1, 2),
+    # 再試行を使い切ったら空のDataFrame
+    ([httpx.Response(503)], 0, RETRY_TOTAL + 1),
+    # JSONでない本文は再試行せず空のDataFrame
+    ([httpx.Response(200, text="<html>maintenance</html>")], 0, 1),
+])
+def test_estat_get_retries(monkeypatch, estat_api, responses, expected_rows, expected_calls):
+    """e-Stat 非同期取得の再試行・失敗時の挙動テスト"""
+    monkeypatch.setattr("data_collection.e_stat_api.RETRY_BACKOFF_FACTOR", 0)
+    
+    df, calls = _fetch_with_responses(estat_api, responses)
+    
+    assert len(df) == expected_rows
+    assert calls == expected_calls
+
+
+def test_validated_stats_parquet_roundtrip(estat_api, tmp_path):
+    """検証済み統計Parquetが読み戻せ、同一時点の複数系列を保持するかのテスト"""
+    values = [
+        {'@time': '2024-01', '@cat01': 'A', '$': '1.5', '@unit': '%'},
+        {'@time': '2024-01', '@cat01': 'B', '$': '2.5', '@unit': '%'},
+        {'@time': '2024-02', '@cat01': 'A', '$': '1.6', '@unit': '%'},
+        {'@time': 'bad', '@cat01': 'A', '$': '3.0', '@unit': '%'},
+    ]
+    staged = estat_api._parse_stats_data(
+        {'GET_STATS_DATA': {'STATISTICAL_DATA': {'DATA_INF': {'VALUE': values}}}}
+    )
+    source = tmp_path / "staged.parquet"
+    staged.to_parquet(source, compression='zstd', index=False)
+    
+    destination = tmp_path / "validated.parquet"
+    assert validate_stats_parquet(str(source), str(destination)) == 3
+    
+    df = pd.read_parquet(destination)
+    assert df['date'].tolist() == [pd.Timestamp('2024-01-01')] * 2 + [pd.Timestamp('2024-02-01')]
+    assert df['value'].tolist() == [1.5, 2.5, 1.6]
+    assert df['unit'].astype(str).tolist() == ['%'] * 3
 
 
-def test_xgboost_model_initialization():
+@pytest.mark.xdist_group("ml")
+def test_xgboost_model_initialization(xgb_model):
     """XGBoostモデルの初期化テスト"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-    
-    from ml.models.xgboost_model import StockPredictionModel
-    
-    model = StockPredictionModel()
-    assert model.model is not None
-    assert model.model.get_params()['objective'] == 'reg:squarederror'
+    assert xgb_model.model is None
+    assert xgb_model.model_version == "1.0"
+    assert xgb_model.feature_names == ()
 
 
-def test_mock_prediction():
+@pytest.mark.xdist_group("ml")
+def test_mock_prediction(prediction_model, sample_data):
     """予測機能のモックテスト"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-    
-    from ml.models.xgboost_model import StockPredictionModel
-    
-    model = StockPredictionModel()
-    
-    # サンプルデータ作成
-    sample_data = pd.DataFrame({
-        'feature1': [1, 2, 3, 4, 5],
-        'feature2': [2, 3, 4, 5, 6],
-        'feature3': [3, 4, 5, 6, 7],
-    })
-    
-    sample_target = pd.Series([100, 110, 105, 115, 120])
-    
-    # 学習テスト
-    model.train(sample_data, sample_target)
+    sample_features, _ = sample_data
     
     # 予測テスト
-    predictions = model.predict(sample_data)
+    predictions = prediction_model.predict(sample_features)
     
-    assert len(predictions) == len(sample_data)
-    assert all(isinstance(p, (int, float)) for p in predictions)
+    assert len(predictions) == len(sample_features)
+    assert np.asarray(predictions).dtype.kind in "fiu"
+
+
+@pytest.mark.xdist_group("ml")
+def test_predict_memoizes_deduplicated_rows(prediction_model, sample_data, tmp_path):
+    """予測キャッシュ・重複行の集約・キャッシュ破棄のテスト"""
+    model = prediction_model
+    features, target = sample_data
+    X = np.vstack([features, features[[0, 0, 3]]])
+    expected = model.model.inplace_predict(model._scale(X, model.mu, model.sd))
+    
+    # 重複行を含んでも行ごとの直接予測と一致する
+    predictions = model.predict(X)
+    np.testing.assert_array_equal(predictions, expected)
+    
+    # 返却値を書き換えてもキャッシュは汚れない
+    predictions[:] = -1.0
+    np.testing.assert_array_equal(model.predict(X), expected)
+    assert len(model._pred_cache) == 1
+    
+    # 再学習・読み込みでキャッシュは破棄される
+    model.train(features, target, num_boost_round=1, max_depth=2, nthread=1, device='cpu')
+    assert not model._pred_cache
+    model.predict(X)
+    model.save_model(str(tmp_path / "model"))
+    model.load_model(str(tmp_path / "model"))
+    assert not model._pred_cache
+
+
+@pytest.mark.xdist_group("ml")
+def test_model_save_load_roundtrip(prediction_model, sample_data, tmp_path):
+    """モデル保存（.ubj / .meta.json / .scaler.npz）の往復テスト"""
+    features, _ = sample_data
+    path = str(tmp_path / "model")
+    prediction_model.save_model(path)
+    
+    loaded = XGBoostStockPredictor(model_version="0.0")
+    loaded.load_model(path)
+    
+    np.testing.assert_array_equal(loaded.predict(features), prediction_model.predict(features))
+    np.testing.assert_array_equal(loaded.mu, prediction_model.mu)
+    np.testing.assert_array_equal(loaded.sd, prediction_model.sd)
+    assert loaded.model_version == prediction_model.model_version
+    assert loaded.feature_names == prediction_model.feature_names
+
+
+@pytest.mark.xdist_group("ml")
+def test_save_untrained_model_raises(tmp_path):
+    """未学習モデルの保存はエラーになるかのテスト"""
+    with pytest.raises(ValueError, match="Model not trained yet"):
+        XGBoostStockPredictor().save_model(str(tmp_path / "model"))
+
+
+@pytest.mark.xdist_group("ml")
+def test_technical_indicators_match_pandas():
+    """テクニカル指標カーネルがpandas実装と一致するかのテスト"""
+    rng = np.random.default_rng(0)
+    close = pd.Series(1000 + np.cumsum(rng.normal(0, 10, 300)))
+    volume = pd.Series(rng.integers(1000, 5000, 300).astype(float))
+    volume.iloc[250] = np.nan
+    
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    expected = {
+        'sma_20': close.rolling(20).mean(),
+        'sma_200': close.rolling(200).mean(),
+        'volatility': close.pct_change().rolling(20).std(),
+        'rsi': 100 - (100 / (1 + gain / loss)),
+        'macd': macd,
+        'signal': macd.ewm(span=9, adjust=False).mean(),
+        'return_lag_5': close.pct_change(5),
+        'volume_ratio': volume / volume.rolling(20).mean(),
+    }
+    
+    out = np.empty((len(close), len(TECHNICAL_FEATURES)), dtype=np.float32)
+    _compute_technical_indicators(close.to_numpy(), volume.to_numpy(), out)
+    
+    for name, series in expected.items():
+        np.testing.assert_allclose(
+            out[:, TECHNICAL_FEATURES.index(name)], series.to_numpy(), rtol=1e-5, err_msg=name
+        )
 
 
 if __name__ == "__main__":
-    print("Running unit tests...")
-    
-    try:
-        test_e_stat_api_initialization()
-        print("✅ e-Stat API initialization test passed")
-    except Exception as e:
-        print(f"❌ e-Stat API test failed: {e}")
-    
-    try:
-        test_boj_scraper_initialization()
-        print("✅ BOJ Scraper initialization test passed")
-    except Exception as e:
-        print(f"❌ BOJ Scraper test failed: {e}")
-    
-    try:
-        test_xgboost_model_initialization()
-        print("✅ XGBoost model initialization test passed")
-    except Exception as e:
-        print(f"❌ XGBoost model test failed: {e}")
-    
-    try:
-        test_mock_prediction()
-        print("✅ Mock prediction test passed")
-    except Exception as e:
-        print(f"❌ Mock prediction test failed: {e}")
-    
-    print("\nAll tests completed!")
+    # フィクスチャを解決するため pytest 経由で実行
+    raise SystemExit(pytest.main([__file__]))